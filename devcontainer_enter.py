@@ -1,20 +1,47 @@
 #!/usr/bin/env python3
-import argparse
-import json
+import http.client
 import os
 import re
+import socket
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from shlex import quote as sh_quote
+from typing import Any, Dict, List, Optional, Tuple
 
-DEV_LABEL_KEY_PATTERNS = [
-    re.compile(r"^devcontainer\.", re.IGNORECASE),
-    re.compile(r"(?:^|[._-])devcontainer(?:[._-]|$)", re.IGNORECASE),
-    re.compile(r"(?:^|[._-])vsch(?:[._-]|$)", re.IGNORECASE),
-]
-NAME_PATTERNS = [re.compile(r"^vsc-", re.IGNORECASE)]
+_json = None
+
+def _loads(data):
+    """JSON-parse str/bytes, resolving the parser lazily on first use.
+
+    Deferred so invocations that never touch JSON (the common filtered-ps
+    path) don't pay the import at startup; orjson is preferred if installed.
+    """
+    global _json
+    if _json is None:
+        try:
+            import orjson as _json_mod  # optional; parses bytes natively, several times faster
+        except ImportError:
+            import json as _json_mod
+        _json = _json_mod
+    return _json.loads(data)
+
+# One alternation instead of a list of patterns: the re engine scans each
+# key once, and Python iterates the keys once instead of keys x patterns.
+_DEV_LABEL_RE = re.compile(
+    r"^devcontainer\.|(?:^|[._-])(?:devcontainer|vsch)(?:[._-]|$)", re.IGNORECASE
+)
 DEV_ENV_VAR = "DEVCONTAINER=true"
+_DEV_ENV_UPPER = DEV_ENV_VAR.upper()
+# Server-side `docker ps` filters that each catch a canonical devcontainer
+# signature. Docker ORs values within one filter key but ANDs across keys,
+# so we run one ps per filter and union the results.
+DEV_PS_FILTERS = [
+    "label=devcontainer.local_folder",
+    "label=devcontainer.metadata",
+    "name=vsc-",
+]
 
 def run_out(cmd: List[str], *, check: bool = True) -> str:
     """Return stdout (str). If check=False, swallow nonzero but return output."""
@@ -30,6 +57,20 @@ def run_out(cmd: List[str], *, check: bool = True) -> str:
         print(f"Error: binary not found on host: {cmd[0]!r}. Is it installed and in PATH?", file=sys.stderr)
         sys.exit(127)
 
+def run_out_bytes(cmd: List[str], *, check: bool = True) -> bytes:
+    """Like run_out but returns raw stdout bytes, skipping the text decode."""
+    try:
+        cp = subprocess.run(cmd, capture_output=True, check=check)
+        return (cp.stdout or b"").strip()
+    except subprocess.CalledProcessError as e:
+        if check:
+            sys.stderr.buffer.write(e.stderr or e.stdout or b"")
+            raise
+        return (e.stdout or e.stderr or b"").strip()
+    except FileNotFoundError:
+        print(f"Error: binary not found on host: {cmd[0]!r}. Is it installed and in PATH?", file=sys.stderr)
+        sys.exit(127)
+
 def run_rc(cmd: List[str]) -> Tuple[int, str, str]:
     """Return (rc, stdout, stderr) for a host command."""
     try:
@@ -38,96 +79,272 @@ def run_rc(cmd: List[str]) -> Tuple[int, str, str]:
     except FileNotFoundError:
         return 127, "", f"binary not found on host: {cmd[0]!r}"
 
-def docker_ps_rows() -> List[Tuple[str, str, str]]:
-    fmt = "{{.ID}}||{{.Names}}||{{.Image}}"
-    out = run_out(["docker", "ps", "--format", fmt], check=False)
+def run_rc_quiet(cmd: List[str]) -> int:
+    """Return only the exit code; output goes to /dev/null undecoded."""
+    try:
+        return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+    except FileNotFoundError:
+        return 127
+
+def docker_ps_rows(filters: List[str] = None) -> List[Tuple[str, str, str, str]]:
+    fmt = "{{.ID}}||{{.Names}}||{{.Image}}||{{.Labels}}"
+    cmd = ["docker", "ps", "--format", fmt]
+    for f in filters or []:
+        cmd += ["--filter", f]
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    except FileNotFoundError:
+        print(f"Error: binary not found on host: {cmd[0]!r}. Is it installed and in PATH?", file=sys.stderr)
+        sys.exit(127)
     rows = []
-    for line in out.splitlines():
-        if not line.strip():
-            continue
-        parts = line.split("||", 3)
-        if len(parts) == 3:
-            rows.append((parts[0], parts[1], parts[2]))
+    # Stream rows as docker emits them; partition avoids the per-line list
+    # that split() would allocate.
+    with proc:
+        for line in proc.stdout:
+            cid, _, rest = line.rstrip("\n").partition("||")
+            name, _, rest = rest.partition("||")
+            image, _, labels = rest.partition("||")
+            if image:
+                rows.append((cid, name, image, labels))
     return rows
 
-def docker_inspect(id_: str) -> Dict[str, Any]:
-    fmt = '{{json .Config.Labels}}||{{json .Config.Env}}'
-    out = run_out(["docker", "inspect", "--format", fmt, id_])
-    labels_json, env_json = out.split("||", 1)
-    labels = json.loads(labels_json) if labels_json.lower() != "null" else {}
-    env = json.loads(env_json) if env_json.lower() != "null" else []
-    return {"labels": labels or {}, "env": env or []}
+def parse_labels(raw: str) -> Dict[str, str]:
+    """Parse the comma-separated k=v list that `docker ps` emits for {{.Labels}}."""
+    labels: Dict[str, str] = {}
+    for item in raw.split(","):
+        k, sep, v = item.partition("=")
+        if sep and k:
+            labels[k] = v
+    return labels
+
+def _labels_may_match(raw: str) -> bool:
+    """Cheap substring pre-test on the raw {{.Labels}} string.
+
+    Every label heuristic in is_devcontainer looks for "devcontainer" or
+    "vsch" somewhere in a key or value, so if neither substring appears there
+    is no point materializing the dict at all.
+    """
+    raw_l = raw.lower()
+    return "devcontainer" in raw_l or "vsch" in raw_l
+
+DOCKER_SOCKET = "/var/run/docker.sock"
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """http.client connection over the docker unix socket."""
+
+    def __init__(self, socket_path: str, timeout: float = 5.0):
+        super().__init__("localhost", timeout=timeout)
+        self._socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self._socket_path)
+        self.sock = sock
+
+def docker_api_get(path: str) -> Optional[bytes]:
+    """GET a daemon API path over the unix socket; None if it can't serve us.
+
+    Forking the docker CLI pays process startup per call; the socket answers
+    the same queries in a fraction of the time. Callers fall back to the CLI
+    when this returns None (no socket, no permission, API error).
+    """
+    conn = _UnixHTTPConnection(DOCKER_SOCKET)
+    try:
+        conn.request("GET", path)
+        resp = conn.getresponse()
+        if resp.status != 200:
+            return None
+        return resp.read()
+    except (OSError, http.client.HTTPException):
+        return None
+    finally:
+        conn.close()
+
+def docker_inspect_many(ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Fetch Config.Env for all ids in a single `docker inspect` call.
+
+    Only env is requested: labels already travel with the `docker ps` rows, so
+    shipping them again here would just be bytes to decode and throw away.
+    Returns a dict keyed by both the full and the short (12-char) container id,
+    so callers can look up rows from `docker ps` directly.
+    """
+    if not ids:
+        return {}
+    fmt = '{{.Id}}||{{json .Config.Env}}'
+    out = run_out_bytes(["docker", "inspect", "--format", fmt] + list(ids), check=False)
+    infos: Dict[str, Dict[str, Any]] = {}
+    for line in out.splitlines():
+        if b"||" not in line:
+            continue
+        cid_raw, env_json = line.split(b"||", 1)
+        env = _loads(env_json) if env_json.lower() != b"null" else []
+        info = {"env": env or []}
+        cid = cid_raw.decode("ascii", "replace")
+        infos[cid] = info
+        infos[cid[:12]] = info
+    return infos
 
 def is_devcontainer(labels: Dict[str, Any], name: str, env: List[str]) -> bool:
-    if any(p.search(k) for k in labels for p in DEV_LABEL_KEY_PATTERNS):
+    # Ordered cheapest-first: nearly every real devcontainer hits the name
+    # prefix or one of the canonical VS Code label keys, so the regex sweep
+    # and env scan are only reached for oddballs.
+    if name.lower().startswith("vsc-"):
+        return True
+    if "devcontainer.local_folder" in labels or "devcontainer.metadata" in labels:
         return True
-    if any("devcontainer" in str(v).lower() for v in labels.values()):
+    if any(_DEV_LABEL_RE.search(k) for k in labels):
         return True
-    if any(p.search(name) for p in NAME_PATTERNS):
+    # One C-level substring search over all values at once beats a Python
+    # loop that lowercases and scans each value separately.
+    if labels and "devcontainer" in "\x00".join(labels.values()).lower():
         return True
-    if any(e.strip().upper() == DEV_ENV_VAR.upper() for e in env):
+    if env and _DEV_ENV_UPPER in {e.strip().upper() for e in env}:
         return True
     return False
 
-def list_devcontainers(debug: bool = False) -> List[Dict[str, Any]]:
+def list_devcontainers_api(debug: bool = False) -> Optional[List[Dict[str, Any]]]:
+    """Detect devcontainers via the daemon API; None when the socket is unusable."""
+    body = docker_api_get("/containers/json")
+    if body is None:
+        return None
+    try:
+        containers = _loads(body)
+    except ValueError:
+        return None
+
+    rows = [(c.get("Id", ""), (c.get("Names") or ["?"])[0].lstrip("/"),
+             c.get("Image", ""), c.get("Labels") or {}) for c in containers]
+
+    # Env vars need the per-container detail endpoint; fetch them only for
+    # containers the label/name heuristics could not decide, concurrently.
+    residual = [cid for cid, name, _, labels in rows if not is_devcontainer(labels, name, [])]
+    envs: Dict[str, List[str]] = {}
+    if residual:
+        with ThreadPoolExecutor(max_workers=min(8, len(residual))) as ex:
+            for cid, detail in zip(residual, ex.map(
+                    lambda c: docker_api_get(f"/containers/{c}/json"), residual)):
+                if detail is None:
+                    continue
+                try:
+                    envs[cid] = _loads(detail).get("Config", {}).get("Env") or []
+                except ValueError:
+                    pass
+
     devs = []
-    for cid, name, image in docker_ps_rows():
-        info = docker_inspect(cid)
-        if is_devcontainer(info["labels"], name, info["env"]):
-            devs.append({"id": cid, "name": name, "image": image, "labels": info["labels"]})
+    for cid, name, image, labels in rows:
+        if is_devcontainer(labels, name, envs.get(cid, [])):
+            devs.append({"id": cid[:12], "name": name, "image": image, "labels": labels})
         elif debug:
             print(f"[debug] Skipped {name} ({cid[:12]})", file=sys.stderr)
     return devs
 
-def sh_quote(s: str) -> str:
-    return "'" + s.replace("'", "'\"'\"'") + "'"
+def list_devcontainers_cli(debug: bool = False) -> List[Dict[str, Any]]:
+    # The unfiltered listing and the per-filter listings are independent calls
+    # all waiting on the daemon; run them concurrently (the GIL is released
+    # while subprocess waits), so wall-clock is the slowest call, not the sum.
+    with ThreadPoolExecutor(max_workers=len(DEV_PS_FILTERS) + 1) as ex:
+        rows_fut = ex.submit(docker_ps_rows)
+        filtered = list(ex.map(lambda f: docker_ps_rows([f]), DEV_PS_FILTERS))
+        rows = rows_fut.result()
+    prefiltered = {cid for frows in filtered for cid, _, _, _ in frows}
+    labels_by_id = {cid: parse_labels(raw) if _labels_may_match(raw) else {}
+                    for cid, _, _, raw in rows}
 
-def container_supports(cmd: str, container_id: str) -> bool:
-    rc, _, _ = run_rc(["docker", "exec", container_id, "sh", "-lc", f"command -v {cmd} >/dev/null 2>&1"])
-    return rc == 0
+    # Env vars are not part of `docker ps` output; batch-inspect only the
+    # containers the filters and label/name checks could not decide.
+    residual = [cid for cid, name, _, _ in rows
+                if cid not in prefiltered and not is_devcontainer(labels_by_id[cid], name, [])]
+    infos = docker_inspect_many(residual)
 
-def container_home(container_id: str) -> str:
-    home = run_out(["docker", "exec", container_id, "sh", "-lc", "printf %s \"$HOME\""])
-    return home or "/root"
+    devs = []
+    for cid, name, image, _ in rows:
+        env = infos.get(cid, {}).get("env", [])
+        if cid in prefiltered or is_devcontainer(labels_by_id[cid], name, env):
+            devs.append({"id": cid, "name": name, "image": image, "labels": labels_by_id[cid]})
+        elif debug:
+            print(f"[debug] Skipped {name} ({cid[:12]})", file=sys.stderr)
+    return devs
+
+def list_devcontainers(debug: bool = False) -> List[Dict[str, Any]]:
+    devs = list_devcontainers_api(debug=debug)
+    if devs is None:
+        devs = list_devcontainers_cli(debug=debug)
+    return devs
 
-def resolve_container_path(container_id: str, path_spec: str) -> str:
+def _shell_path_expr(path_spec: str) -> str:
+    """Render a path for interpolation into a container-side script, mapping a leading ~ to $HOME."""
     if path_spec.startswith("~"):
-        return container_home(container_id) + path_spec[1:]
-    return path_spec
+        return '"$HOME"' + sh_quote(path_spec[1:])
+    return sh_quote(path_spec)
 
-def container_file_exists(container_id: str, path: str) -> bool:
-    rc, _, _ = run_rc(["docker", "exec", container_id, "sh", "-lc", f"[ -f {sh_quote(path)} ]"])
-    return rc == 0
+def probe_container(container_id: str, marker_spec: str, dest_spec: str) -> Dict[str, str]:
+    """Answer every per-container question the post step needs in one exec.
+
+    Resolves ~ in both paths against the container's $HOME, checks for bash
+    and the marker file, and creates the script's parent directory, all in a
+    single shell round-trip. Returns a dict of key=value facts.
+    """
+    script = (
+        f"M={_shell_path_expr(marker_spec)}; D={_shell_path_expr(dest_spec)}; "
+        'printf "home=%s\\nmarker=%s\\ndest=%s\\n" "$HOME" "$M" "$D"; '
+        'command -v bash >/dev/null 2>&1 && echo has_bash=1 || echo has_bash=0; '
+        '[ -f "$M" ] && echo marker_exists=1 || echo marker_exists=0; '
+        'mkdir -p "$(dirname "$D")"'
+    )
+    out = run_out(["docker", "exec", container_id, "sh", "-lc", script], check=False)
+    facts: Dict[str, str] = {}
+    for line in out.splitlines():
+        k, sep, v = line.partition("=")
+        if sep:
+            facts[k] = v
+    return facts
+
+DEST_SCRIPT_SPEC = "~/.dc-postcommand.sh"
+
+class ContainerCtx:
+    """Per-container facts, gathered by a single probe exec on construction.
+
+    Everything downstream (marker check, shell choice, destination paths)
+    becomes plain attribute access instead of its own docker exec.
+    """
+
+    def __init__(self, container_id: str, marker_spec: str, dest_spec: str = DEST_SCRIPT_SPEC):
+        self.id = container_id
+        facts = probe_container(container_id, marker_spec, dest_spec)
+        self.home = facts.get("home") or "/root"
+        self.has_bash = facts.get("has_bash") == "1"
+        self.shell = "bash" if self.has_bash else "sh"
+        self.marker = facts.get("marker") or marker_spec
+        self.marker_exists = facts.get("marker_exists") == "1"
+        self.dest_script = facts.get("dest") or self.home + "/.dc-postcommand.sh"
 
 def docker_cp_to(container_id: str, src_host: str, dest_in_container: str) -> None:
-    parent = run_out(["docker", "exec", container_id, "sh", "-lc", f"dirname {sh_quote(dest_in_container)}"])
-    run_rc(["docker", "exec", container_id, "sh", "-lc", f"mkdir -p {sh_quote(parent)}"])
+    # The destination's parent directory is created by probe_container.
     rc, out, err = run_rc(["docker", "cp", src_host, f"{container_id}:{dest_in_container}"])
     if rc != 0:
         print(f"[post] docker cp failed (rc={rc}).\n{out}{err}", file=sys.stderr)
         raise SystemExit(rc)
 
-def run_post_script_if_needed(container_id: str, host_script: str, marker_spec: str, force: bool = False, verbose: bool = False):
+def run_post_script_if_needed(ctx: ContainerCtx, host_script: str,
+                              force: bool = False, verbose: bool = False) -> None:
+    """Run the host post script in the container if not already done."""
     host_path = Path(os.path.expanduser(host_script))
     if not host_path.is_file():
         return  # No host script; nothing to do
 
-    marker = resolve_container_path(container_id, marker_spec)
-    if not force and container_file_exists(container_id, marker):
-        print(f"[post] Already set up ({marker}).")
+    if not force and ctx.marker_exists:
+        print(f"[post] Already set up ({ctx.marker}).")
         return
 
-    shell = "bash" if container_supports("bash", container_id) else "sh"
-    dest_script = resolve_container_path(container_id, "~/.dc-postcommand.sh")
-
-    print(f"[post] Copying {host_path} -> {dest_script} ...")
-    docker_cp_to(container_id, str(host_path), dest_script)
+    print(f"[post] Copying {host_path} -> {ctx.dest_script} ...")
+    docker_cp_to(ctx.id, str(host_path), ctx.dest_script)
 
-    cmd = ["docker", "exec", "-i", container_id, shell, "-lc",
-           f"chmod +x {sh_quote(dest_script)} && {sh_quote(dest_script)}"]
+    cmd = ["docker", "exec", "-i", ctx.id, ctx.shell, "-lc",
+           f"chmod +x {sh_quote(ctx.dest_script)} && {sh_quote(ctx.dest_script)}"]
     if verbose:
         print("[post] exec cmd:", " ".join(sh_quote(c) if " " in c else c for c in cmd))
-    print(f"[post] Running post script with {shell} ...")
+    print(f"[post] Running post script with {ctx.shell} ...")
     rc, out, err = run_rc(cmd)
     if rc != 0:
         print(f"[post] Post script failed (rc={rc}).", file=sys.stderr)
@@ -137,12 +354,17 @@ def run_post_script_if_needed(container_id: str, host_script: str, marker_spec:
             print("[post] stderr:\n" + err.strip(), file=sys.stderr)
         return
 
-    run_rc(["docker", "exec", container_id, "sh", "-lc", f": > {sh_quote(marker)}"])
-    print(f"[post] Setup complete. Marker: {marker}")
+    run_rc_quiet(["docker", "exec", ctx.id, "touch", ctx.marker])
+    print(f"[post] Setup complete. Marker: {ctx.marker}")
 
-def exec_interactive_shell(container_id: str) -> int:
-    shell = "bash" if container_supports("bash", container_id) else "sh"
-    return subprocess.call(["docker", "exec", "-it", container_id, shell])
+def exec_interactive_shell(ctx: ContainerCtx) -> int:
+    # Replace this process with docker: the interpreter's memory is freed for
+    # the whole session and signals (Ctrl-C, SIGWINCH) reach docker directly.
+    try:
+        os.execvp("docker", ["docker", "exec", "-it", ctx.id, ctx.shell])
+    except FileNotFoundError:
+        print("Error: binary not found on host: 'docker'. Is it installed and in PATH?", file=sys.stderr)
+        return 127
 
 def print_list(devcs: List[Dict[str, Any]]) -> None:
     if not devcs:
@@ -152,28 +374,52 @@ def print_list(devcs: List[Dict[str, Any]]) -> None:
     for i, c in enumerate(devcs, 1):
         print(f"[{i}] {c['name']}  {c['image']}  {c['id'][:12]}")
 
-def main():
+def enter_container(cid: str, args) -> int:
+    ctx = ContainerCtx(cid, args.marker)
+    if not args.skip_post:
+        run_post_script_if_needed(ctx, args.postscript, force=args.force_post, verbose=args.verbose)
+    return exec_interactive_shell(ctx)
+
+ARG_DEFAULTS = {
+    "selection": None,
+    "debug": False,
+    "verbose": False,
+    "postscript": "~/dc-postcommand.sh",
+    "marker": "~/.dc-post-setup-done",
+    "skip_post": False,
+    "force_post": False,
+}
+
+def parse_args():
+    # The everyday bare invocation ("enter the only devcontainer") needs no
+    # flag parsing; skip the argparse import entirely for it to keep cold
+    # start short when run from shell hooks.
+    if len(sys.argv) <= 1:
+        from types import SimpleNamespace
+        return SimpleNamespace(**ARG_DEFAULTS)
+
+    import argparse
     parser = argparse.ArgumentParser(
         description="Enter VS Code devcontainers; optionally run a one-time post-setup script inside the container."
     )
     parser.add_argument("selection", nargs="?", help="Number of devcontainer to enter.")
     parser.add_argument("--debug", action="store_true", help="Debug detection.")
     parser.add_argument("--verbose", action="store_true", help="Verbose post-step command/outputs.")
-    parser.add_argument("--postscript", default="~/dc-postcommand.sh",
+    parser.add_argument("--postscript", default=ARG_DEFAULTS["postscript"],
                         help="Host setup script path (default: ~/dc-postcommand.sh).")
-    parser.add_argument("--marker", default="~/.dc-post-setup-done",
+    parser.add_argument("--marker", default=ARG_DEFAULTS["marker"],
                         help="Marker file inside the container (default: ~/.dc-post-setup-done). '~' resolves to container $HOME.")
     parser.add_argument("--skip-post", action="store_true", help="Skip running post script.")
     parser.add_argument("--force-post", action="store_true", help="Force re-run post script even if marker exists.")
-    args = parser.parse_args()
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
 
     devcs = list_devcontainers(debug=args.debug)
 
     if args.selection is None and len(devcs) == 1:
-        cid = devcs[0]["id"]
-        if not args.skip_post:
-            run_post_script_if_needed(cid, args.postscript, args.marker, force=args.force_post, verbose=args.verbose)
-        sys.exit(exec_interactive_shell(cid))
+        sys.exit(enter_container(devcs[0]["id"], args))
 
     if args.selection is None:
         print_list(devcs)
@@ -193,10 +439,7 @@ def main():
         print("Selection out of range.", file=sys.stderr)
         sys.exit(3)
 
-    cid = devcs[idx - 1]["id"]
-    if not args.skip_post:
-        run_post_script_if_needed(cid, args.postscript, args.marker, force=args.force_post, verbose=args.verbose)
-    sys.exit(exec_interactive_shell(cid))
+    sys.exit(enter_container(devcs[idx - 1]["id"], args))
 
 if __name__ == "__main__":
     main()